@@ -0,0 +1,226 @@
+# encoding: utf-8
+
+# ================================================================================
+# munki_compat
+#
+# Checks shared by the check-*-compatibility.py condition scripts. Each script
+# supplies its own version limits and board-id/model tables and combines these
+# checks in its main().
+#
+# This is a package directory rather than a module in the conditions directory
+# because munki runs every file in /usr/local/munki/conditions, but skips any
+# subdirectories.
+#
+# ================================================================================
+
+import sys
+import ctypes
+import os
+import plistlib
+
+
+# PyObjC (objc, Foundation) is imported only inside the functions that need it,
+# so a run that fails one of the sysctl or version checks never loads it.
+kIOMasterPortDefault = 0
+
+libc = ctypes.CDLL("/usr/lib/libc.dylib")
+
+
+# Set by the calling script; set to False for no output, just the exit codes
+verbose = True
+
+SYSTEM_VERSION = plistlib.readPlist("/System/Library/CoreServices/SystemVersion.plist")
+PRODUCT_VERSION = tuple(int(x) for x in SYSTEM_VERSION['ProductVersion'].split('.'))
+
+# Status lines collected by logger() until write_log() is called
+log_lines = []
+
+# IOPlatformExpertDevice properties, filled in by get_platform_property()
+platform_properties = {}
+
+
+def logger(message, status, info):
+    if verbose:
+        log_lines.append("%14s: %-40s [%s]" % (message, status, info))
+    pass
+
+
+def write_log():
+    # Print everything logged so far with a single write
+    if log_lines:
+        sys.stdout.write("\n".join(log_lines) + "\n")
+        del log_lines[:]
+
+
+def conditional_items_path():
+    # <https://github.com/munki/munki/wiki/Conditional-Items>
+    # Read the location of the ManagedInstallDir from ManagedInstall.plist
+    from Foundation import CFPreferencesCopyAppValue
+    bundle_id = 'ManagedInstalls'
+    pref_name = 'ManagedInstallDir'
+    managed_installs_dir = CFPreferencesCopyAppValue(pref_name, bundle_id)
+    # Make sure we're outputting our information to "ConditionalItems.plist"
+    if managed_installs_dir:
+        return os.path.join(managed_installs_dir, 'ConditionalItems.plist')
+    else:
+        # Munki default
+        return "/Library/Managed Installs/ConditionalItems.plist"
+
+
+def munki_installed():
+    return os.path.exists("/var/db/receipts/com.googlecode.munki.core.plist")
+
+
+def gruntwork_munki_installed():
+    return os.path.exists("/var/db/receipts/com.mac-msp.gruntwork.munki3.plist")
+
+
+def is_system_version_supported(minimum_version, maximum_version):
+    # Supported if minimum_version <= version < maximum_version, both as int tuples
+    product_name = SYSTEM_VERSION['ProductName']
+    product_version = SYSTEM_VERSION['ProductVersion']
+    if PRODUCT_VERSION >= maximum_version:
+        logger("System",
+               "%s %s" % (product_name, product_version),
+               "Failed")
+        return False
+    elif PRODUCT_VERSION >= minimum_version:
+        logger("System",
+               "%s %s" % (product_name, product_version),
+               "OK")
+        return True
+    else:
+        logger("System",
+               "%s %s" % (product_name, product_version),
+               "Failed")
+        return False
+
+
+def sysctl_value(name, value):
+    size = ctypes.c_size_t(ctypes.sizeof(value))
+    if libc.sysctlbyname(name, ctypes.byref(value), ctypes.byref(size), None, 0) != 0:
+        return None
+    return value.value
+
+
+def get_platform_property(name):
+    # Read board-id and model together, so the registry is only searched once
+    if not platform_properties:
+        import objc
+        from Foundation import NSBundle
+        IOKit_bundle = NSBundle.bundleWithIdentifier_('com.apple.framework.IOKit')
+        iokit = {}
+        objc.loadBundleFunctions(IOKit_bundle, iokit, [
+            ("IOServiceGetMatchingService", "II@"),
+            ("IOServiceMatching", "@*"),
+            ("IORegistryEntryCreateCFProperty", "@I@@I"),
+        ])
+        service = iokit["IOServiceGetMatchingService"](
+            kIOMasterPortDefault, iokit["IOServiceMatching"]("IOPlatformExpertDevice"))
+        for key in ("board-id", "model"):
+            value = iokit["IORegistryEntryCreateCFProperty"](service, key, None, 0)
+            if value:
+                value = bytes(value).rstrip(b'\x00').decode()
+            platform_properties[key] = value
+    return platform_properties.get(name)
+
+
+def get_board_id():
+    board_id = get_platform_property("board-id")
+    if board_id and board_id.startswith('Mac'):
+        return board_id
+    else:
+        return None
+
+
+def get_current_model():
+    return get_platform_property("model")
+
+
+def is_64bit_capable():
+    if sysctl_value("hw.cpu64bit_capable", ctypes.c_uint32()):
+        logger("CPU",
+               "64 bit capable",
+               "OK")
+        return True
+    else:
+        logger("CPU",
+               "not 64 bit capable",
+               "Failed")
+        return False
+
+
+def has_required_amount_of_memory(minimum_gigabytes):
+    minimum_memory = int(minimum_gigabytes * 1024 * 1024 * 1024)
+    actual_memory = sysctl_value("hw.memsize", ctypes.c_uint64()) or 0
+    actual_memory_gigabytes = actual_memory / 1024 / 1024 / 1024
+    if actual_memory >= minimum_memory:
+        logger("Memory",
+               "%i GB physical memory installed" % actual_memory_gigabytes,
+               "OK")
+        return True
+    else:
+        logger("Memory",
+               "%i GB installed, %i GB required" % (actual_memory_gigabytes, minimum_gigabytes),
+               "Failed")
+        return False
+
+
+def is_virtual_machine():
+    vmm_present = sysctl_value("kern.hv_vmm_present", ctypes.c_uint32())
+    if vmm_present is None:
+        # Older releases lack kern.hv_vmm_present, look for the VMM CPU feature instead
+        features = sysctl_value("machdep.cpu.features", ctypes.create_string_buffer(1024)) or ""
+        vmm_present = " VMM " in " %s " % features
+    if vmm_present:
+        logger("Board ID",
+               "Virtual machine",
+               "OK")
+        return True
+    return False
+
+
+def is_supported_model(non_supported_models):
+    current_model = get_current_model()
+    if current_model in non_supported_models:
+        logger("Model",
+               "\"%s\" is not supported" % current_model,
+               "Failed")
+        return False
+    else:
+        logger("Model",
+               current_model,
+               "OK")
+        return True
+
+
+def is_supported_board_id(platform_support_values):
+    board_id = get_board_id()
+    if board_id in platform_support_values:
+        logger("Board ID",
+               board_id,
+               "OK")
+        return True
+    else:
+        logger("Board ID",
+               "\"%s\" is not supported" % board_id,
+               "Failed")
+        return False
+
+
+def append_conditional_items(dictionary):
+    # Let CoreFoundation read and write the plist; unlike plistlib it also
+    # handles ConditionalItems.plist files saved in binary format
+    from Foundation import NSMutableDictionary
+    current_conditional_items_path = conditional_items_path()
+    if os.path.exists(current_conditional_items_path):
+        output_dict = NSMutableDictionary.dictionaryWithContentsOfFile_(current_conditional_items_path)
+        if output_dict is None:
+            # Don't overwrite conditions written by other scripts
+            raise IOError("Could not read %s" % current_conditional_items_path)
+    else:
+        output_dict = NSMutableDictionary.dictionary()
+    output_dict.addEntriesFromDictionary_(dictionary)
+    if not output_dict.writeToFile_atomically_(current_conditional_items_path, True):
+        raise IOError("Could not write %s" % current_conditional_items_path)
+    pass